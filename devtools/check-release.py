@@ -7,29 +7,23 @@
 # Copyright(c) 2023 Ericsson AB
 #
 
-import getopt
+import argparse
 import git
 import os
 import re
 import subprocess
 import sys
+import tempfile
 
-from functools import total_ordering
-
-
-def usage(name):
-    print("%s [-c <cmd>] <release-sha|release-tag>" % name)
-    print("Options:")
-    print("  -c <cmd>  Run command <cmd>. Default is to run all.")
-    print("  -h        Print this text.")
-    print("Commands:")
-    print("  meta     Only check release meta data.")
-    print("  changes  Only list changes with previous release.")
-    print("  test     Only run the test suites.")
+from bisect import bisect_left
+from collections import defaultdict, deque
+from functools import lru_cache
+from types import MappingProxyType
+from typing import NamedTuple
 
 
 def prefix(msg, *args):
-    print("%s: " % msg, end="")
+    print(f"{msg}: ", end="")
     print(*args, end="")
     print(".")
 
@@ -43,49 +37,23 @@ def note(*args):
     prefix("NOTE", *args)
 
 
-@total_ordering
-class Version:
-    def __init__(self, major, minor, patch=None):
-        self.major = major
-        self.minor = minor
-        self.patch = patch
+class Version(NamedTuple):
+    major: int
+    minor: int
+    patch: int
 
     def __str__(self):
-        s = "%d.%d" % (self.major, self.minor)
-        if self.patch is not None:
-            s += ".%d" % self.patch
-        return s
-
-    def __lt__(self, other):
-        if self.major == other.major:
-            if self.minor == other.minor:
-                if self.patch is None:
-                    assert other.patch is None
-                    return False
-                return self.patch < other.patch
-            return self.minor < other.minor
-        else:
-            return self.major < other.major
-
-    def __eq__(self, other):
-        if self.major != other.major or  \
-           self.minor != other.minor:
-            return False
-        if self.patch is None:
-            return other.patch is None
-        else:
-            if other.patch is None:
-                return False
-            return self.patch == other.patch
+        return f"{self.major}.{self.minor}.{self.patch}"
 
 
 setup_version_re = \
-    re.compile(r'version="([0-9]+).([0-9]+)\.([0-9]+)"')
+    re.compile(rb'version="([0-9]+).([0-9]+)\.([0-9]+)"')
 
 
+@lru_cache(maxsize=64)
 def get_setup_version(commit):
     fileobj = commit.tree / 'setup.py'
-    data = fileobj.data_stream.read().decode('utf-8')
+    data = fileobj.data_stream.read()
     m = setup_version_re.search(data)
 
     if m is None:
@@ -99,16 +67,17 @@ def get_setup_version(commit):
 
 
 server_major_version_re = \
-    re.compile(r'MAJOR_VERSION *= *([0-9]+)')
+    re.compile(rb'MAJOR_VERSION *= *([0-9]+)')
 server_minor_version_re = \
-    re.compile(r'MINOR_VERSION *= *([0-9]+)')
+    re.compile(rb'MINOR_VERSION *= *([0-9]+)')
 server_patch_version_re = \
-    re.compile(r'PATCH_VERSION *= *([0-9]+)')
+    re.compile(rb'PATCH_VERSION *= *([0-9]+)')
 
 
+@lru_cache(maxsize=64)
 def get_server_version(commit):
     fileobj = commit.tree / 'paf/server.py'
-    data = fileobj.data_stream.read().decode('utf-8')
+    data = fileobj.data_stream.read()
 
     major = server_major_version_re.search(data)
     if major is None:
@@ -127,20 +96,42 @@ def get_server_version(commit):
                    int(patch.groups()[0]))
 
 
+# The cached helpers below return immutable objects (tuples, and
+# read-only mappings), since the cached objects are shared among all
+# callers.
+@lru_cache(maxsize=None)
 def get_release_tags(repo):
-    return [t for t in repo.tags if tag_re.match(t.name)]
+    return tuple(t for t in repo.tags if tag_re.match(t.name))
+
+
+@lru_cache(maxsize=None)
+def build_tag_index(repo):
+    release_tags = {tag.name: tag for tag in get_release_tags(repo)}
+
+    # For annotated tags, '*objectname' is the SHA of the tagged commit
+    refs = repo.git.for_each_ref(
+        '--format=%(refname:strip=2) %(objectname) %(*objectname)',
+        'refs/tags/')
+
+    tag_index = defaultdict(list)
+    for line in refs.splitlines():
+        name, *shas = line.split()
+        tag = release_tags.get(name)
+        if tag is not None:
+            tag_index[shas[-1]].append(tag)
+    return MappingProxyType({sha: tuple(tags)
+                             for sha, tags in tag_index.items()})
 
 
 def get_commit_release_tags(repo, commit):
-    return [tag for tag in get_release_tags(repo) if tag.commit == commit]
+    return build_tag_index(repo).get(commit.hexsha, ())
 
 
 def get_commit_release_tag(repo, commit):
     tags = get_commit_release_tags(repo, commit)
 
     if len(tags) != 1:
-        fail("Could not find exactly one release tag for commit %s" %
-             release_commit)
+        fail(f"Could not find exactly one release tag for commit {commit}")
 
     return tags[0]
 
@@ -149,70 +140,56 @@ def get_release_versions(repo):
     return [get_tag_version(tag) for tag in get_release_tags(repo)]
 
 
-def get_prev_release_tag(repo, release_version):
-
-    release_tags = get_release_tags(repo)
-
-    candidate = None
+@lru_cache(maxsize=None)
+def get_sorted_releases(repo):
+    releases = [(get_tag_version(tag), tag) for tag in get_release_tags(repo)]
+    releases.sort(key=lambda release: release[0])
+    return tuple(releases)
 
-    for tag in release_tags[1:]:
-        v = get_tag_version(tag)
 
-        if v.major != release_version.major or \
-           v.minor > release_version.minor:
-            continue
+@lru_cache(maxsize=None)
+def get_sorted_release_versions(repo):
+    return tuple(version for version, tag in get_sorted_releases(repo))
 
-        if v.minor == release_version.minor and \
-           v.patch >= release_version.patch:
-            continue
 
-        if candidate is None:
-            candidate = tag
-            continue
+def get_prev_release_tag(repo, release_version):
+    releases = get_sorted_releases(repo)
+    versions = get_sorted_release_versions(repo)
 
-        candidate_v = get_tag_version(candidate)
-        if v.minor > candidate_v.minor:
-            candidate = tag
-            continue
+    idx = bisect_left(versions, release_version)
 
-        if v.minor == candidate_v.minor and v.patch > candidate_v.patch:
-            candidate = tag
-            continue
+    if idx == 0 or versions[idx - 1].major != release_version.major:
+        fail(f"Unable to find the release previous to {release_version}")
 
-    if candidate is None:
-        fail("Unable to find the release previous to %s" % release_version)
+    _, prev = releases[idx - 1]
 
-    return candidate
+    return prev
 
 
 tag_re = re.compile('^v[0-9]+')
+tag_version_re = re.compile(r'^v([0-9]+)\.([0-9]+)\.([0-9]+)')
 
 
 def tag_name(version):
-    return "v%s" % version
+    return f"v{version}"
 
 
+@lru_cache(maxsize=None)
 def get_tag_version(tag):
-    assert tag.name[0] == 'v'
-    v = tag.name[1:].split('.')
-    major = int(v[0])
-    minor = int(v[1])
-    patch = int(v[2])
-    return Version(major, minor, patch)
+    m = tag_version_re.match(tag.name)
+    assert m is not None
+    return Version(int(m[1]), int(m[2]), int(m[3]))
 
 
 def check_against_previous(this_version, prev_version):
     if this_version < prev_version:
-        fail("Previous version \"%s\" is higher than this version \"%s\"" % \
-             (prev_version, this_version))
+        fail(f"Previous version \"{prev_version}\" is higher than this "
+             f"version \"{this_version}\"")
 
 
-def check_meta(repo, release_commit):
-    release_tag = get_commit_release_tag(repo, release_commit)
-
+def check_meta(repo, release_commit, release_tag, tag_version, workdir):
     setup_version = get_setup_version(release_commit)
     server_version = get_server_version(release_commit)
-    tag_version = get_tag_version(release_tag)
 
     if tag_version != setup_version:
         fail("Version according to tag and according to setup.py differ")
@@ -221,135 +198,121 @@ def check_meta(repo, release_commit):
         fail("Version according to tag and according to server.py differ")
 
     prev_release_tag = get_prev_release_tag(repo, tag_version)
-    prev_setup_version = get_setup_version(prev_release_tag.commit)
+    prev_version = get_tag_version(prev_release_tag)
 
     print("Release information:")
-    print("  Version (from setup.py): %s" % setup_version)
+    print(f"  Version (from setup.py): {setup_version}")
     print("  Commit:")
-    print("    SHA: %s" % release_commit.hexsha)
-    print("    Summary: %s" % release_commit.summary)
-    print("  Previous release: %s" % prev_setup_version)
+    print(f"    SHA: {release_commit.hexsha}")
+    print(f"    Summary: {release_commit.summary}")
+    print(f"  Previous release: {prev_version}")
     print("Releases:")
     for version in get_release_versions(repo):
-        print("  %s" % version)
+        print(f"  {version}")
 
-    check_against_previous(setup_version, prev_setup_version)
+    check_against_previous(setup_version, prev_version)
 
 
-def check_changes(repo, release_commit):
-    release_tag = get_commit_release_tag(repo, release_commit)
+def check_changes(repo, release_commit, release_tag, release_version,
+                  workdir):
+    prev_release_tag = get_prev_release_tag(repo, release_version)
 
-    prev_release_tag = get_prev_release_tag(repo, get_tag_version(release_tag))
+    rev = f'{prev_release_tag}..{release_tag}'
 
-    rev = '%s..%s' % (prev_release_tag, release_tag)
+    print(f"Changes between {get_tag_version(prev_release_tag)} and "
+          f"{release_version}:")
+    changes = repo.git.log(rev, format=" %h %s")
+    if len(changes) > 0:
+        print(changes)
 
-    print("Changes between %s and %s:" % (get_tag_version(prev_release_tag),
-                                          get_tag_version(release_tag)))
-    for commit in repo.iter_commits(rev=rev):
-        short_sha = repo.git.rev_parse(commit, short=True)
-        print(" %s %s" % (short_sha, commit.summary))
 
+MAX_FAILURE_OUTPUT_LINES = 1000
 
-def run(cmd):
-    res = subprocess.run(cmd, shell=True, stdout=subprocess.PIPE,
-                         stderr=subprocess.STDOUT, encoding='utf-8')
 
-    if res.returncode != 0:
-        sys.stderr.write(res.stdout)
+def run(args, cwd=None):
+    # Only the tail of the output is retained, to be shown in case
+    # the command fails.
+    output = deque(maxlen=MAX_FAILURE_OUTPUT_LINES)
+
+    with subprocess.Popen(args, cwd=cwd, stdout=subprocess.PIPE,
+                          stderr=subprocess.STDOUT,
+                          encoding='utf-8') as process:
+        for line in process.stdout:
+            output.append(line)
+
+    if process.returncode != 0:
+        sys.stderr.writelines(output)
         sys.exit(1)
 
 
-EXTRA_CFLAGS="-Werror"
+def extract(release_commit, release_version, workdir):
+    name = f"paf-{release_version}"
+    srcdir = os.path.join(workdir, name)
 
-def test_build_separate_build_dir(repo, release_commit):
-    release_tag = get_commit_release_tag(repo, release_commit)
+    if os.path.isdir(srcdir):
+        return srcdir
+
+    archive = subprocess.Popen(["git", "archive", f"--prefix={name}/",
+                                "--format=tar", release_commit.hexsha],
+                               stdout=subprocess.PIPE)
+    tar = subprocess.Popen(["tar", "x"], cwd=workdir, stdin=archive.stdout)
+    archive.stdout.close()
+
+    if tar.wait() != 0 or archive.wait() != 0:
+        fail(f"Unable to extract {release_commit.hexsha}")
+
+    return srcdir
 
-    print("Test build w/ separate build directory.")
-    cmd = """
-set -e
-tmpdir=`mktemp -d`; \\
-libpafdir=libpaf-%s; \\
-tarfile=$tmpdir/$libpafdir.tar; \\
-git archive --prefix=$libpafdir/ --format=tar -o $tarfile %s; \\
-cd $tmpdir; \\
-tar xf $tarfile; \\
-cd $libpafdir; \\
-autoreconf -i; \\
-mkdir build; \\
-cd build; \\
-../configure; \\
-make -j; \\
-""" % (get_tag_version(release_tag), release_commit)
-
-    run(cmd)
-
-def run_test(repo, release_commit):
-    release_tag = get_commit_release_tag(repo, release_commit)
 
-    print("Running test suite for %s." % release_tag)
+def run_test(repo, release_commit, release_tag, release_version, workdir):
+    print(f"Running test suite for {release_tag}.")
 
-    cmd = """
-set -e
-tmpdir=`mktemp -d`; \\
-pafdir=paf-%s; \\
-tarfile=$tmpdir/$pafdir.tar; \\
-git archive --prefix=$pafdir/ --format=tar -o $tarfile %s;\\
-cd $tmpdir; \\
-tar xf $tarfile; \\
-cd $pafdir; \\
-make check; \\
-""" % (get_tag_version(release_tag), release_commit)
+    srcdir = extract(release_commit, release_version, workdir)
 
-    run(cmd)
+    run(["make", "check"], cwd=srcdir)
 
     print("OK")
 
+
 def check_repo(repo):
     if repo.is_dirty():
         fail("Repository contains modifications")
 
 
-optlist, args = getopt.getopt(sys.argv[1:], 'c:mh')
+COMMANDS = {
+    'meta': check_meta,
+    'changes': check_changes,
+    'test': run_test
+}
 
-cmd = None
 
-for opt, optval in optlist:
-    if opt == '-h':
-        usage(sys.argv[0])
-        sys.exit(0)
-    if opt == '-c':
-        cmd = optval
+def main():
+    parser = argparse.ArgumentParser(description="Verify a paf release.")
+    parser.add_argument('-c', metavar='CMD', dest='cmd',
+                        choices=COMMANDS.keys(),
+                        help="only run command CMD (meta: check release "
+                        "meta data, changes: list changes with previous "
+                        "release, test: run the test suites); default is "
+                        "to run all")
+    parser.add_argument('release', metavar='release-sha|release-tag')
+    args = parser.parse_args()
 
-if len(args) != 1:
-    usage(sys.argv[0])
-    sys.exit(1)
+    repo = git.Repo()
+    check_repo(repo)
+
+    release_commit = repo.commit(args.release)
+    release_tag = get_commit_release_tag(repo, release_commit)
+    release_version = get_tag_version(release_tag)
+
+    if args.cmd is None:
+        cmds = COMMANDS.values()
+    else:
+        cmds = [COMMANDS[args.cmd]]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for cmd in cmds:
+            cmd(repo, release_commit, release_tag, release_version, workdir)
 
-repo = git.Repo()
-check_repo(repo)
-
-release_commit = repo.commit(args[0])
-
-meta = False
-changes = False
-test = False
-
-if cmd == 'meta':
-    meta = True
-elif cmd == 'changes':
-    changes = True
-elif cmd == 'test':
-    test = True
-elif cmd is None:
-    meta = True
-    changes = True
-    test = True
-else:
-    print("Unknown cmd '%s'." % cmd)
-    sys.exit(1)
 
-if meta:
-    check_meta(repo, release_commit)
-if changes:
-    check_changes(repo, release_commit)
-if test:
-    run_test(repo, release_commit)
+if __name__ == '__main__':
+    main()
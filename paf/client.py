@@ -6,6 +6,7 @@ from enum import Enum
 import errno
 import json
 import random
+import re
 import select
 import time
 import os
@@ -56,6 +57,8 @@ class TransactionState(Enum):
 
 
 class Transaction:
+    __slots__ = ('ta_id', 'ta_type', 'state', 'cb')
+
     def __init__(self, ta_type, ta_id):
         self.ta_id = ta_id
         self.ta_type = ta_type
@@ -123,18 +126,19 @@ class Transaction:
 
 
 def wait(conn, criteria):
-    poll = select.poll()
-    poll.register(conn.fileno(), select.POLLIN)
     while not criteria():
-        poll.poll()
+        conn.conn_poll.poll()
         conn.process()
 
 
 class Call:
+    __slots__ = ('conn', 'ta_id', 'result', 'reason', 'done')
+
     def __init__(self, conn):
         self.conn = conn
         self.ta_id = None
         self.result = None
+        self.done = False
 
     def __call__(self, ta_id, event, *args, **optargs):
         assert self.ta_id is not None
@@ -142,22 +146,24 @@ class Call:
         self.result = event
         if self.result == EventType.FAIL:
             self.reason = optargs.get('fail_reason')
+        self.done = event in (EventType.COMPLETE, EventType.FAIL)
 
     def get(self):
-        wait(self.conn, lambda: self.result == EventType.COMPLETE or
-             self.result == EventType.FAIL)
+        wait(self.conn, lambda: self.done)
         if self.result == EventType.FAIL:
             raise TransactionError(reason=self.reason)
 
 
 class LatencyCall(Call):
+    __slots__ = ('start', 'latency')
+
     def __init__(self, conn):
-        self.start = time.time()
+        self.start = time.monotonic_ns()
         Call.__init__(self, conn)
 
     def __call__(self, ta_id, event, *args):
         if event == EventType.COMPLETE:
-            self.latency = time.time() - self.start
+            self.latency = (time.monotonic_ns() - self.start) / 1e9
         Call.__call__(self, ta_id, event, *args)
 
     def get(self):
@@ -166,6 +172,8 @@ class LatencyCall(Call):
 
 
 class NotifyCall(Call):
+    __slots__ = ('notifications',)
+
     def __init__(self, conn):
         Call.__init__(self, conn)
         self.notifications = []
@@ -184,6 +192,8 @@ class NotifyCall(Call):
 
 
 class CompleteCall(Call):
+    __slots__ = ('complete',)
+
     def __init__(self, conn):
         Call.__init__(self, conn)
 
@@ -266,6 +276,9 @@ class Client:
         except xcm.error as e:
             raise TransportError(str(e))
 
+        self.conn_poll = select.poll()
+        self.conn_poll.register(self.conn_sock.fileno(), select.POLLIN)
+
         server_conf.check_proto_version_range(proto.VERSION_RANGE)
 
         self.proto_version_range = server_conf.proto_version_range()
@@ -277,8 +290,12 @@ class Client:
         self.ready_cb = ready_cb
         self.ta_id = 0
         self.out_wire_msgs = deque()
+        # A list indexed by transaction id would be cheaper to look up
+        # in, but long-lived transactions (e.g., subscriptions and
+        # track) would prevent it from ever being compacted.
         self.transactions = {}
         self.proto_version = None
+        self.target_condition = None
         self.update()
         try:
             self.initial_hello()
@@ -378,8 +395,7 @@ class Client:
         return self.gen_id()
 
     def gen_id(self):
-        INT64_MAX = 0x7fffffffffffffff
-        return random.randint(0, INT64_MAX)
+        return random.getrandbits(63)
 
     def next_ta_id(self):
         ta_id = self.ta_id
@@ -432,48 +448,72 @@ class Client:
         condition = xcm.SO_RECEIVABLE
         if len(self.out_wire_msgs) > 0:
             condition |= xcm.SO_SENDABLE
-        self.conn_sock.set_target(condition)
+        if condition != self.target_condition:
+            self.conn_sock.set_target(condition)
+            self.target_condition = condition
 
     def process(self):
-        for i in range(0, MAX_MSGS_PER_ROUND):
-            if not self.try_send():
-                break
-        for i in range(0, MAX_MSGS_PER_ROUND):
-            if not self.try_receive():
-                break
+        # The XCM socket target condition is updated only once per
+        # round, rather than after every message sent or received.
+        try_send = self._try_send
+        try_receive = self._try_receive
+        try:
+            for i in range(0, MAX_MSGS_PER_ROUND):
+                if not try_send():
+                    break
+            for i in range(0, MAX_MSGS_PER_ROUND):
+                if not try_receive():
+                    break
+        finally:
+            self.update()
 
     def try_send(self):
         try:
-            if len(self.out_wire_msgs) > 0:
-                out_wire_msg = self.out_wire_msgs.popleft()
+            return self._try_send()
+        finally:
+            self.update()
+
+    def try_receive(self):
+        try:
+            return self._try_receive()
+        finally:
+            self.update()
+
+    # The _try_send() and _try_receive() methods leave the XCM socket
+    # target condition as-is, and the caller must call update().
+    def _try_send(self):
+        out_wire_msgs = self.out_wire_msgs
+        try:
+            if len(out_wire_msgs) > 0:
+                out_wire_msg = out_wire_msgs.popleft()
                 self.conn_sock.send(out_wire_msg)
                 return True
             else:
                 return False
         except xcm.error as e:
             if e.errno == errno.EAGAIN:
-                self.out_wire_msgs.appendleft(out_wire_msg)
+                out_wire_msgs.appendleft(out_wire_msg)
                 return False
             else:
                 raise TransportError(str(e))
-        finally:
-            self.update()
 
-    def try_receive(self):
+    def _try_receive(self):
         try:
             in_wire_msg = self.conn_sock.receive()
             if len(in_wire_msg) == 0:
                 raise ProtocolError("Server closed connection")
 
             in_msg = proto.Message.parse(self.proto_version, in_wire_msg)
+            ta_id = in_msg.ta_id
 
-            transaction = self.transactions.get(in_msg.ta_id)
+            transactions = self.transactions
+            transaction = transactions.get(ta_id)
             if transaction is None:
                 raise ProtocolError("Received message related to unknown "
-                                    "transaction %d" % in_msg.ta_id)
+                                    "transaction %d" % ta_id)
             transaction.consume_message(in_msg)
             if transaction.state == TransactionState.TERMINATED:
-                del self.transactions[in_msg.ta_id]
+                del transactions[ta_id]
             return True
         except xcm.error as e:
             if e.errno == errno.EAGAIN:
@@ -482,8 +522,6 @@ class Client:
                 raise TransportError(str(e))
         except ValueError:
             raise ProtocolError("Error decoding response message JSON")
-        finally:
-            self.update()
 
 
 DOMAINS_ENV = 'PAF_DOMAINS'
@@ -507,21 +545,15 @@ def domain_filename(domain):
 
 
 def list_domains():
-    d = domains_dir()
-    for f in os.listdir(d):
-        if os.path.isfile(os.path.join(d, f)):
-            yield f
+    with os.scandir(domains_dir()) as entries:
+        for entry in entries:
+            if entry.is_file():
+                yield entry.name
 
 
 def looks_like_json_object(s):
     # see RFC 7159, section 2 for grammar
-    for c in s:
-        if c in ('\n', '\r', ' ', '\t'):
-            continue
-        if c == '{':
-            return True
-        return False
-    return False
+    return s.lstrip('\n\r \t').startswith('{')
 
 
 def parse_domain_json(data):
@@ -542,14 +574,13 @@ def parse_domain_json(data):
     return servers
 
 
+# Matches the stripped contents of non-empty, non-comment lines
+DOMAIN_CUSTOM_ADDR_RE = re.compile(r'^[^\S\n]*([^\s#][^\n]*?)\s*$',
+                                   re.MULTILINE)
+
+
 def parse_domain_custom(data):
-    servers = []
-    for line in data.split('\n'):
-        addr = line.strip()
-        if len(addr) == 0 or addr[0] == '#':
-            continue
-        servers.append(ServerConf(addr))
-    return servers
+    return [ServerConf(addr) for addr in DOMAIN_CUSTOM_ADDR_RE.findall(data)]
 
 
 def read_domain(domain):
@@ -573,7 +604,7 @@ def domain_server(domain):
 
 
 def allocate_client_id():
-    return random.randint(0, ((1 << 63) - 1))
+    return random.getrandbits(63)
 
 
 def connect(domain_or_addr_or_conf, client_id=None, ready_cb=None,
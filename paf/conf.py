@@ -1,7 +1,11 @@
 # SPDX-License-Identifier: BSD-3-Clause
 # Copyright(c) 2020 Ericsson AB
 
+import functools
 import logging
+import logging.handlers
+import sys
+import types
 
 import paf.sd as sd
 import paf.proto as proto
@@ -25,21 +29,22 @@ class Error(Exception):
 
 class MissingFieldError(Error):
     def __init__(self, dict_path, dict_key):
-        Error.__init__(self, "required parameter '%s' is missing" %
-                       path(dict_path, dict_key))
+        Error.__init__(self, f"required parameter "
+                       f"'{path(dict_path, dict_key)}' is missing")
 
 
 class DuplicateFieldError(Error):
     def __init__(self, dict_path, dict_key):
-        Error.__init__(self, "parameter '%s' was used in combination "
-                       "with one of its aliases" % path(dict_path, dict_key))
+        Error.__init__(self, f"parameter '{path(dict_path, dict_key)}' was "
+                       "used in combination with one of its aliases")
 
 
 class FormatError(Error):
     def __init__(self, field_name, illegal_value, valid_values=None):
-        message = "invalid %s: '%s'" % (field_name, illegal_value)
+        message = f"invalid {field_name}: '{illegal_value}'"
         if valid_values is not None:
-            message += " (valid values: %s)" % " ".join(valid_values)
+            # 'valid_values' is a space-separated list of values
+            message += f" (valid values: {valid_values})"
         Error.__init__(self, message)
 
 
@@ -53,12 +58,30 @@ LOG_LEVELS = {
 
 FACILITY_NAMES = logging.handlers.SysLogHandler.facility_names
 
+LOG_LEVELS_DESC = " ".join(LOG_LEVELS)
+FACILITY_NAMES_DESC = " ".join(FACILITY_NAMES)
 
-def path(*args):
-    return ".".join([arg for arg in args if len(arg) > 0])
+
+def inverse(names):
+    # In case several names map to the same code, the first one wins
+    codes = {}
+    for name, code in names.items():
+        codes.setdefault(code, name)
+    return codes
+
+
+LOG_LEVEL_NAMES = inverse(LOG_LEVELS)
+FACILITY_CODE_NAMES = inverse(FACILITY_NAMES)
+
+
+def path(parent, name):
+    return ".".join([arg for arg in (parent, name) if len(arg) > 0])
 
 
 class LogConf:
+    __slots__ = ('console', 'log_file', 'log_file_backup', 'log_file_max_size',
+                 'syslog', 'syslog_socket', 'facility', 'filter')
+
     def __init__(self):
         self.console = DEFAULT_LOG_CONSOLE
         self.log_file = DEFAULT_LOG_FILE
@@ -88,86 +111,98 @@ class LogConf:
         self.syslog_socket = syslog_socket
 
     def set_filter(self, level_name):
-        try:
-            self.filter = LOG_LEVELS[level_name]
-        except KeyError:
-            raise FormatError("filter level", level_name, LOG_LEVELS.keys())
-
-    def set_facility(self, facility):
-        try:
-            self.facility = FACILITY_NAMES[facility]
-        except KeyError:
-            raise FormatError("log facility", facility, FACILITY_NAMES.keys())
+        level = LOG_LEVELS.get(level_name)
+        if level is None:
+            raise FormatError("filter level", level_name, LOG_LEVELS_DESC)
+        self.filter = level
+
+    def set_facility(self, facility_name):
+        facility = FACILITY_NAMES.get(facility_name)
+        if facility is None:
+            raise FormatError("log facility", facility_name,
+                              FACILITY_NAMES_DESC)
+        self.facility = facility
 
     def filter_name(self):
-        for name, code in LOG_LEVELS.items():
-            if code == self.filter:
-                return name
+        return LOG_LEVEL_NAMES.get(self.filter)
 
     def facility_name(self):
-        for name, code in FACILITY_NAMES.items():
-            if code == self.facility:
-                return name
+        return FACILITY_CODE_NAMES.get(self.facility)
 
     def __str__(self):
         if self.log_file is None:
             log_file_s = "-"
+        elif self.log_file_backup > 0:
+            log_file_s = f"{self.log_file}, " \
+                f"log_file_backup: {self.log_file_backup:d}, " \
+                f"log_file_max_size: {self.log_file_max_size:d}"
         else:
-            log_file_s = "%s, log_file_backup: %d" % \
-                (self.log_file, self.log_file_backup)
-            if self.log_file_backup > 0:
-                log_file_s += ", log_file_max_size: %d" % \
-                    self.log_file_max_size
+            log_file_s = f"{self.log_file}, " \
+                f"log_file_backup: {self.log_file_backup:d}"
 
-        syslog_s = str(self.syslog).lower()
         if self.syslog:
-            syslog_s += ", syslog_socket: '%s'" % self.syslog_socket
+            syslog_s = f"true, syslog_socket: '{self.syslog_socket}'"
+        else:
+            syslog_s = "false"
+
+        return f"{{ console: {str(self.console).lower()}, " \
+            f"log_file: '{log_file_s}', syslog: {syslog_s}, " \
+            f"filter: {self.filter_name()}, " \
+            f"facility: {self.facility_name()} }}"
+
+
+RESOURCE_TYPES = {
+    'clients': sd.ResourceType.CLIENT,
+    'services': sd.ResourceType.SERVICE,
+    'subscriptions': sd.ResourceType.SUBSCRIPTION
+}
+
+
+def resource_type(name):
+    try:
+        return RESOURCE_TYPES[name]
+    except KeyError:
+        raise FormatError("resource type", name)
+
 
-        return "{ console: %s, log_file: '%s', syslog: %s, filter: %s, " \
-            "facility: %s }" % (str(self.console).lower(), log_file_s,
-                                syslog_s, self.filter_name(),
-                                self.facility_name())
+# Template for resource classes without limits. Must not be modified.
+NO_RESOURCE_LIMITS = sd.resources()
 
 
 class ResourcesClassConf:
+    __slots__ = ('resources',)
+
     def __init__(self, max_clients=None):
-        self.resources = sd.resources(clients=max_clients)
+        if max_clients is None:
+            self.resources = NO_RESOURCE_LIMITS.copy()
+        else:
+            self.resources = sd.resources(clients=max_clients)
 
     def set_limit(self, name, value):
         if not isinstance(value, int) or value < 0:
             raise FormatError("resource limit", value)
-        if name == "clients":
-            self.resources[sd.ResourceType.CLIENT] = value
-        elif name == "services":
-            self.resources[sd.ResourceType.SERVICE] = value
-        elif name == "subscriptions":
-            self.resources[sd.ResourceType.SUBSCRIPTION] = value
-        else:
-            raise FormatError("resource type", name)
+        self.resources[resource_type(name)] = value
 
     def clear_limit(self, name):
-        self.set_limit(self, name, None)
+        self.resources[resource_type(name)] = None
 
     def get_client_limit(self):
         return self.resources[sd.ResourceType.CLIENT]
 
     def has_limits(self):
-        for value in self.resources.values():
-            if value is not None:
-                return True
-        return False
+        return any(value is not None for value in self.resources.values())
 
     def __str__(self):
-        limits = []
-        for resource_type in sd.ResourceType:
-            value = self.resources[resource_type]
-            if value is not None:
-                limits.append("%s: %d" %
-                              (resource_type.name.lower(), value))
-        return "{ %s }" % ", ".join(limits)
+        # sd.resources() creates the dict in ResourceType order
+        limits = [f"{rtype.name.lower()}: {value:d}"
+                  for rtype, value in self.resources.items()
+                  if value is not None]
+        return f"{{ {', '.join(limits)} }}"
 
 
 class ResourcesConf:
+    __slots__ = ('user', 'total')
+
     def __init__(self):
         self.user = \
             ResourcesClassConf()
@@ -179,42 +214,51 @@ class ResourcesConf:
 
     def __str__(self):
         sections = []
-        for name in ("user", "total"):
-            class_resources = getattr(self, name)
-            if class_resources.has_limits():
-                sections.append("%s: %s" % (name, class_resources))
-        return "{ %s }" % ", ".join(sections)
+        if self.user.has_limits():
+            sections.append(f"user: {self.user}")
+        if self.total.has_limits():
+            sections.append(f"total: {self.total}")
+        return f"{{ {', '.join(sections)} }}"
+
+
+# Read-only, and thus safe to share among all non-TLS sockets
+EMPTY_TLS_ATTRS = types.MappingProxyType({})
 
 
 class SocketConf:
+    __slots__ = ('addr', 'tls_attrs')
+
     def __init__(self, addr, tls_attrs):
         self.addr = addr
         self.tls_attrs = tls_attrs
 
     def __str__(self):
-        s = {"addr": self.addr}
+        # Formatted as a dict, but without creating one
         if len(self.tls_attrs) > 0:
-            s["tls"] = self.tls_attrs
-        return str(s)
+            return f"{{'addr': {self.addr!r}, 'tls': {self.tls_attrs!r}}}"
+        else:
+            return f"{{'addr': {self.addr!r}}}"
 
     def __repr__(self):
         return str(self)
 
 
 class ProtoVersionLimitConf:
+    __slots__ = ('version_min', 'version_max')
+
     def __init__(self, version_min=proto.MIN_VERSION,
                  version_max=proto.MAX_VERSION):
         if version_min > version_max:
             raise Error("minimum protocol version must be equal or less "
                         "than the maximum")
         if version_max > proto.MAX_VERSION:
-            raise Error("configured maximum protocol version (%d) is higher "
-                        "than the highest supported version (%d)" %
-                        (version_max, proto.MAX_VERSION))
+            raise Error(f"configured maximum protocol version "
+                        f"({version_max:d}) is higher than the highest "
+                        f"supported version ({proto.MAX_VERSION:d})")
         if version_min < proto.MIN_VERSION:
-            raise Error("configured minimum protocol version (%d) is lower "
-                        "than the lowest supported version (%d)" %
-                        (version_min, proto.MIN_VERSION))
+            raise Error(f"configured minimum protocol version "
+                        f"({version_min:d}) is lower than the lowest "
+                        f"supported version ({proto.MIN_VERSION:d})")
         self.version_min = version_min
         self.version_max = version_max
 
@@ -229,79 +273,100 @@ class ProtoVersionLimitConf:
 
 
 class DomainConf:
+    __slots__ = ('name', 'proto_version_limit', 'idle_limit', 'sockets')
+
     def __init__(self, name, proto_version_limit, idle_limit):
         self.name = name
         self.proto_version_limit = proto_version_limit
         self.idle_limit = idle_limit
         self.sockets = []
 
-    def add_socket(self, addr, tls_attrs={}):
+    def add_socket(self, addr, tls_attrs=EMPTY_TLS_ATTRS):
         self.sockets.append(SocketConf(addr, tls_attrs))
 
+    def add_sockets(self, addrs):
+        self.sockets.extend([SocketConf(addr, EMPTY_TLS_ATTRS)
+                             for addr in addrs])
+
     def __str__(self):
-        s = {}
+        # The output has the form of a printed dict, but is produced
+        # without creating one.
+        parts = []
 
         if self.name is not None:
-            s["name"] = self.name
+            parts.append(f"'name': {self.name!r}")
 
-        s["sockets"] = self.sockets
+        sockets = ", ".join([str(socket) for socket in self.sockets])
+        parts.append(f"'sockets': [{sockets}]")
 
-        s["protocol_version"] = {
-            "min": self.proto_version_limit.version_min,
-            "max": self.proto_version_limit.version_max
-        }
+        version_limit = self.proto_version_limit
+        parts.append(f"'protocol_version': "
+                     f"{{'min': {version_limit.version_min!r}, "
+                     f"'max': {version_limit.version_max!r}}}")
+
+        idle_limit = self.idle_limit
+        parts.append(f"'idle': {{'min': {idle_limit.idle_min!r}, "
+                     f"'max': {idle_limit.idle_max!r}}}")
+
+        return f"{{{', '.join(parts)}}}"
 
-        s["idle"] = {
-            "min": self.idle_limit.idle_min,
-            "max": self.idle_limit.idle_max
-        }
 
-        return str(s)
+# The protocol version and idle limits are never modified after
+# creation, and the defaults may thus be shared among domains.
+DEFAULT_PROTO_VERSION_LIMIT = ProtoVersionLimitConf()
+DEFAULT_IDLE_LIMIT = sd.IdleLimit(DEFAULT_IDLE_MIN, DEFAULT_IDLE_MAX)
 
 
 class Conf:
+    __slots__ = ('log', 'domains', 'resources')
+
     def __init__(self):
         self.log = LogConf()
         self.domains = []
         self.resources = ResourcesConf()
 
-    def add_domain(self, name=None,
-                   proto_version_limit=ProtoVersionLimitConf(),
-                   idle_limit=sd.IdleLimit(DEFAULT_IDLE_MIN,
-                                           DEFAULT_IDLE_MAX)):
+    def add_domain(self, name=None, proto_version_limit=None,
+                   idle_limit=None):
+        if proto_version_limit is None:
+            proto_version_limit = DEFAULT_PROTO_VERSION_LIMIT
+        if idle_limit is None:
+            idle_limit = DEFAULT_IDLE_LIMIT
         domain_conf = DomainConf(name, proto_version_limit, idle_limit)
         self.domains.append(domain_conf)
         return domain_conf
 
     def set_domains(self, domains):
         self.domains = []
-        for domain in domains:
-            domain_conf = self.add_domain()
-            for socket in domain:
-                domain_conf.add_socket(socket)
+        for addrs in domains:
+            self.add_domain().add_sockets(addrs)
 
     def __str__(self):
         sections = []
-        sections.append("domains: [%s]" %
-                        ", ".join([str(domain) for domain in self.domains]))
+        domains = ", ".join([str(domain) for domain in self.domains])
+        sections.append(f"domains: [{domains}]")
 
-        sections.append("log: %s" % self.log)
+        sections.append(f"log: {self.log}")
 
         if self.resources.has_limits():
-            sections.append("resources: %s" % self.resources)
+            sections.append(f"resources: {self.resources}")
 
         return ", ".join(sections)
 
 
 def assure_type(value, value_type, path):
     if not isinstance(value, value_type):
-        raise Error("parameter '%s' has invalid value type: '%s' (expected "
-                    "'%s')" % (path, type(value), value_type))
+        raise Error(f"parameter '{path}' has invalid value type: "
+                    f"'{type(value)}' (expected '{value_type}')")
 
 
 def dict_lookup(dict_value, dict_keys, value_type, dict_path, required=False,
                 default=None):
     if (isinstance(dict_keys, str)):
+        # Fast path for a single, alias-less, key with a valid value.
+        # Any other case is left to the generic code below.
+        value = dict_value.get(dict_keys)
+        if value is not None and isinstance(value, value_type):
+            return value
         dict_keys = [dict_keys]
 
     value = None
@@ -318,84 +383,97 @@ def dict_lookup(dict_value, dict_keys, value_type, dict_path, required=False,
             raise MissingFieldError(dict_path, dict_key)
         return default
 
-    assure_type(value, value_type, path(dict_path, dict_key))
+    # The type check is done in place, to avoid the call, and the
+    # parameter path formatting, in the common case of a valid value.
+    if not isinstance(value, value_type):
+        assure_type(value, value_type, path(dict_path, dict_key))
 
     return value
 
 
-def dict_copy(dict_value, dict_key, value_type, dict_path, set_value,
-              required=False):
-    value = dict_lookup(dict_value, dict_key, value_type, dict_path,
-                        required=required)
-    if value is not None:
-        set_value(value)
+LOG_FIELDS = (
+    ("console", bool, LogConf.set_console),
+    ("log_file", str, LogConf.set_log_file),
+    ("log_file_backup", int, LogConf.set_log_file_backup),
+    ("log_file_max_size", int, LogConf.set_log_file_max_size),
+    ("syslog", bool, LogConf.set_syslog),
+    ("syslog_socket", str, LogConf.set_syslog_socket),
+    ("facility", str, LogConf.set_facility),
+    ("filter", str, LogConf.set_filter)
+)
 
 
 def log_populate(conf, log, path):
     if log is None:
         return
-    dict_copy(log, "console", bool, path, conf.log.set_console)
-    dict_copy(log, "log_file", str, path, conf.log.set_log_file)
-    dict_copy(log, "log_file_backup", int, path, conf.log.set_log_file_backup)
-    dict_copy(log, "log_file_max_size", int, path,
-              conf.log.set_log_file_max_size)
-    dict_copy(log, "syslog", bool, path, conf.log.set_syslog)
-    dict_copy(log, "syslog_socket", str, path, conf.log.set_syslog_socket)
-    dict_copy(log, "facility", str, path, conf.log.set_facility)
-    dict_copy(log, "filter", str, path, conf.log.set_filter)
+    log_conf = conf.log
+    for key, value_type, set_value in LOG_FIELDS:
+        value = dict_lookup(log, key, value_type, path)
+        if value is not None:
+            set_value(log_conf, value)
+
+
+TLS_PROTOS = frozenset(("tls", "utls"))
+TLS_ADDR_PREFIXES = ("tls:", "utls:")
 
 
 def assure_tls_addr(field_name, addr):
-    proto = addr.split(":")[0]
-    if proto != "tls" and proto != "utls":
-        raise FormatError(field_name, proto, ["tls", "utls"])
+    # Fast path for the common case, without allocating any strings
+    if addr.startswith(TLS_ADDR_PREFIXES):
+        return
+    proto = addr.partition(":")[0]
+    if proto not in TLS_PROTOS:
+        raise FormatError(field_name, proto, "tls utls")
 
 
 def domains_populate(conf, domains, path):
     if domains is None:
         return
     for domain_num, domain in enumerate(domains):
-        domain_path = "%s[%d]" % (path, domain_num)
+        domain_path = f"{path}[{domain_num}]"
         assure_type(domain, dict, domain_path)
 
         name = dict_lookup(domain, "name", str, domain_path, required=False)
 
-        version_min = proto.MIN_VERSION
-        version_max = proto.MAX_VERSION
-
+        # Domains without protocol version or idle limits configured
+        # share the default limit objects.
         version = domain.get("protocol_version")
-        if version is not None:
-            version_path = "%s.protocol_version" % domain_path
+        if version is None:
+            proto_version_limit = DEFAULT_PROTO_VERSION_LIMIT
+        else:
+            version_path = f"{domain_path}.protocol_version"
 
             version_min = dict_lookup(version, "min", int, version_path,
-                                      default=version_min, required=False)
-
+                                      default=proto.MIN_VERSION)
             version_max = dict_lookup(version, "max", int, version_path,
-                                      default=version_max, required=False)
+                                      default=proto.MAX_VERSION)
 
-        proto_version_limit = ProtoVersionLimitConf(version_min, version_max)
+            proto_version_limit = \
+                ProtoVersionLimitConf(version_min, version_max)
 
-        idle_min = DEFAULT_IDLE_MIN
+        idle = domain.get("idle")
+        if idle is None and "max_idle_time" not in domain:
+            idle_limit = DEFAULT_IDLE_LIMIT
+        else:
+            idle_min = DEFAULT_IDLE_MIN
 
-        # 'max_idle_time' is a legacy name for 'idle_max'
-        idle_max = dict_lookup(domain, "max_idle_time", int,
-                               domain_path, default=DEFAULT_IDLE_MAX,
-                               required=False)
+            # 'max_idle_time' is a legacy name for 'idle_max'
+            idle_max = dict_lookup(domain, "max_idle_time", int,
+                                   domain_path, default=DEFAULT_IDLE_MAX)
 
-        idle = domain.get("idle")
-        if idle is not None:
-            idle_path = "%s.idle" % domain_path
+            if idle is not None:
+                idle_path = f"{domain_path}.idle"
 
-            idle_min = dict_lookup(idle, "min", int, idle_path,
-                                   default=DEFAULT_IDLE_MIN, required=False)
+                idle_min = dict_lookup(idle, "min", int, idle_path,
+                                       default=DEFAULT_IDLE_MIN)
 
-            if "max_idle_time" in domain and "max" in idle:
-                raise DuplicateFieldError(domain_path, "max_idle_time")
+                if "max_idle_time" in domain and "max" in idle:
+                    raise DuplicateFieldError(domain_path, "max_idle_time")
 
-            idle_max = dict_lookup(idle, "max", int, idle_path,
-                                   default=DEFAULT_IDLE_MAX, required=False)
+                idle_max = dict_lookup(idle, "max", int, idle_path,
+                                       default=DEFAULT_IDLE_MAX)
 
-        idle_limit = sd.IdleLimit(idle_min, idle_max)
+            idle_limit = sd.IdleLimit(idle_min, idle_max)
 
         # 'addrs' is a legacy name for 'sockets'
         sockets = dict_lookup(domain, ["sockets", "addrs"], list, domain_path,
@@ -403,23 +481,26 @@ def domains_populate(conf, domains, path):
 
         domain_conf = conf.add_domain(name, proto_version_limit, idle_limit)
 
+        add_socket = domain_conf.add_socket
+
         for socket_num, socket in enumerate(sockets):
-            socket_path = "%s.sockets[%d]" % (domain_path, socket_num)
             if isinstance(socket, str):
-                domain_conf.add_socket(socket, {})
+                add_socket(socket)
             elif isinstance(socket, dict):
+                socket_path = f"{domain_path}.sockets[{socket_num}]"
+
                 if "addr" not in socket:
                     raise MissingFieldError(socket_path, "addr")
 
                 addr = socket["addr"]
 
                 if "tls" in socket:
-                    assure_tls_addr("%s.addr" % socket_path, addr)
+                    assure_tls_addr(f"{socket_path}.addr", addr)
                     tls_attrs = socket["tls"]
                 else:
-                    tls_attrs = {}
+                    tls_attrs = EMPTY_TLS_ATTRS
 
-                domain_conf.add_socket(addr, tls_attrs)
+                add_socket(addr, tls_attrs)
             else:
                 raise FormatError("domain address", socket)
 
@@ -442,21 +523,82 @@ def resources_populate(conf, resources, path):
     resource_class_copy(total, conf.resources.total.set_limit)
 
 
+SECTIONS = (
+    ("log", dict, log_populate),
+    ("domains", list, domains_populate),
+    ("resources", dict, resources_populate)
+)
+
+
 def populate(conf, source):
     assure_type(source, dict, "")
-    log_populate(conf, dict_lookup(source, "log", dict, ""), "log")
-    domains_populate(conf, dict_lookup(source, "domains", list, ""), "domains")
-    resources_populate(conf, dict_lookup(source, "resources", dict, ""),
-                       "resources")
+    for name, section_type, section_populate in SECTIONS:
+        # Sections are optional, and commonly absent
+        section = source.get(name)
+        if section is not None:
+            assure_type(section, section_type, name)
+            section_populate(conf, section, name)
 
 
 def default():
     return Conf()
 
 
+def intern_keys(value):
+    if isinstance(value, dict):
+        return {
+            sys.intern(k) if isinstance(k, str) else k: intern_keys(v)
+            for k, v in value.items()
+        }
+    elif isinstance(value, list):
+        return [intern_keys(v) for v in value]
+    else:
+        return value
+
+
+# The yaml module is only imported (and the loader selected) in case a
+# configuration file is actually read, and then only once.
+@functools.lru_cache(maxsize=None)
+def yaml_parser():
+    import yaml
+
+    # The libyaml-based loader is only available in case PyYAML was
+    # built with libyaml support.
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+    return functools.partial(yaml.load, Loader=loader)
+
+
+def yaml_load(data):
+    return yaml_parser()(data)
+
+
+def load_source(conf_file):
+    with open(conf_file, 'rb') as f:
+        data = f.read()
+
+    source = None
+
+    # JSON is a subset of YAML, and a configuration file in JSON form
+    # may be parsed with the much faster JSON decoder. A YAML file in
+    # flow style may also start with a '{', so in case the content
+    # turns out not to be valid JSON, the YAML parser is used instead.
+    if data.lstrip().startswith(b'{'):
+        try:
+            source = proto.json_decode(data)
+        except ValueError:
+            pass
+
+    if source is None:
+        source = yaml_load(data)
+
+    # The keys are interned to match the (compiler-interned) string
+    # literals used for lookups by identity, rather than by comparison.
+    return intern_keys(source)
+
+
 def load(conf_file):
     conf = Conf()
-    import yaml
-    source = yaml.safe_load(open(conf_file).read())
+    source = load_source(conf_file)
     populate(conf, source)
     return conf
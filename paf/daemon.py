@@ -3,6 +3,7 @@
 
 import sys
 import getopt
+import importlib
 import os
 
 import paf.sd
@@ -57,11 +58,40 @@ def early_error(message):
     sys.exit(1)
 
 
+def int_optval(optval, name):
+    try:
+        return int(optval)
+    except ValueError:
+        early_error("%s must be an integer." % name)
+
+
+def set_client_limit(conf, optval):
+    clients = int_optval(optval, "Client limit")
+    if clients == 0:
+        conf.resources.total.clear_limit("clients")
+    else:
+        conf.resources.total.set_limit("clients", clients)
+
+
+# Options which modify the configuration, and nothing else
+CONF_OPTS = {
+    '-s': lambda conf, optval: conf.log.set_console(True),
+    '-o': lambda conf, optval: conf.log.set_log_file(optval),
+    '-b': lambda conf, optval: conf.log.set_log_file_backup(
+        int_optval(optval, "Backup file count")),
+    '-x': lambda conf, optval: conf.log.set_log_file_max_size(
+        int_optval(optval, "Backup file max size")),
+    '-n': lambda conf, optval: conf.log.set_syslog(False),
+    '-u': lambda conf, optval: conf.log.set_syslog_socket(optval),
+    '-l': lambda conf, optval: conf.log.set_filter(optval),
+    '-y': lambda conf, optval: conf.log.set_facility(optval),
+    '-c': set_client_limit
+}
+
+
 def run_hook(hook, servers):
     try:
-        import importlib
-        module_name = '.'.join(hook.split('.')[:-1])
-        fun_name = hook.split('.')[-1]
+        module_name, _, fun_name = hook.rpartition('.')
         module = importlib.import_module(module_name)
         fun = getattr(module, fun_name)
 
@@ -116,10 +146,22 @@ def main(argv):
     except getopt.GetoptError as e:
         early_error("Error parsning command line: %s." % e)
 
+    # Help and version requests are served before anything else is
+    # done, and the configuration file must be read before any other
+    # options are applied on top of it.
     conf_filename = None
     for opt, optval in optlist:
         if opt == '-f':
             conf_filename = optval
+        elif opt == '-v':
+            print(f"Server version: {paf.server.VERSION}")
+            versions = " ".join(map(str, paf.proto.VERSIONS))
+            print(f"Protocol version(s): {versions}")
+            sys.exit(0)
+        elif opt == '-h':
+            usage(argv[0])
+            sys.exit(0)
+
     if conf_filename is None:
         conf = paf.conf.default()
     else:
@@ -130,56 +172,14 @@ def main(argv):
 
     domains = [[domain_addr] for domain_addr in args]
 
-    if len(domains) > 0:
-        conf.set_domains(domains)
-
     for opt, optval in optlist:
-        if opt == '-m':
-            domain = []
-            for addr in optval.split('+'):
-                domain.append(addr)
-            domains.append(domain)
-        elif opt == '-s':
-            conf.log.set_console(True)
-        elif opt == '-o':
-            conf.log.set_log_file(optval)
-        elif opt == '-b':
-            try:
-                conf.log.set_log_file_backup(int(optval))
-            except ValueError:
-                early_error("Backup file count must be an integer.")
-        elif opt == '-x':
-            try:
-                conf.log.set_log_file_max_size(int(optval))
-            except ValueError:
-                early_error("Backup file max size must be an integer.")
-        elif opt == '-n':
-            conf.log.set_syslog(False)
-        elif opt == '-u':
-            conf.log.set_syslog_socket(optval)
-        elif opt == '-l':
-            conf.log.set_filter(optval)
-        elif opt == '-y':
-            conf.log.set_facility(optval)
-        elif opt == '-c':
-            try:
-                clients = int(optval)
-                if clients == 0:
-                    conf.resources.total.clear_limit("clients")
-                else:
-                    conf.resources.total.set_limit("clients", clients)
-            except ValueError:
-                early_error("Client limit must be an integer.")
+        conf_opt = CONF_OPTS.get(opt)
+        if conf_opt is not None:
+            conf_opt(conf, optval)
+        elif opt == '-m':
+            domains.append(optval.split('+'))
         elif opt == '-r':
             hook = optval
-        elif opt == '-v':
-            print(f"Server version: {paf.server.VERSION}")
-            versions = " ".join(map(str, paf.proto.VERSIONS))
-            print(f"Protocol version(s): {versions}")
-            sys.exit(0)
-        elif opt == '-h':
-            usage(argv[0])
-            sys.exit(0)
 
     if len(domains) > 0:
         conf.set_domains(domains)
@@ -187,8 +187,9 @@ def main(argv):
     if len(conf.domains) == 0:
         early_error("No domains configured.")
 
+    syslog_ident = 'pafd[%d]: ' % os.getpid()
+
     try:
-        syslog_ident = 'pafd[%d]: ' % os.getpid()
         paf.logging.configure(conf.log.console, conf.log.log_file,
                               conf.log.log_file_backup,
                               conf.log.log_file_max_size, conf.log.syslog,
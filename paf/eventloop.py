@@ -1,19 +1,18 @@
 # SPDX-License-Identifier: BSD-3-Clause
 # Copyright(c) 2020 Ericsson AB
 
+import collections
+import heapq
+import itertools
 import select
 import time
 import signal
-import fcntl
 import os
 
 
-def set_nonblocking(fd):
-    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
-    fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
-
-
 class Source:
+    __slots__ = ('fd', 'mask', 'timeout', 'active', 'listener')
+
     def __init__(self):
         self.fd = None
         self.mask = None
@@ -73,24 +72,47 @@ class Source:
 
 
 class XcmSource (Source):
+    __slots__ = ('xcm_sock', 'condition')
+
     def __init__(self, xcm_sock):
         Source.__init__(self)
         self.xcm_sock = xcm_sock
+        self.condition = None
         self.set_fd(xcm_sock.fileno(), select.EPOLLIN)
 
     def update(self, condition):
-        self.xcm_sock.set_target(condition)
+        # The XCM socket's target condition is only changed on
+        # transitions, since update() is called after every bit of
+        # socket activity, with the condition mostly being unchanged.
+        if condition != self.condition:
+            self.xcm_sock.set_target(condition)
+            self.condition = condition
 
 
 EPOLL_MAX_TIMEOUT = (((1 << 31)-1)/1000)
 
 
 class EventLoop:
+    __slots__ = ('source_handler', 'source_fd', 'source_timeout',
+                 'timeout_heap', 'timeout_seq', 'source_active',
+                 'active_queue', 'fd_source', '_stop', 'epoll', 's_rfd',
+                 's_wfd')
+
     def __init__(self):
         self.source_handler = {}
         self.source_fd = {}
+        # Timeouts are kept in a min-heap of (timeout, seq, source,
+        # handler) entries. A changed or removed timeout leaves its
+        # old entry in the heap, where it's considered stale, and is
+        # skipped over (and eventually dropped).
         self.source_timeout = {}
+        self.timeout_heap = []
+        self.timeout_seq = itertools.count()
+        # Active sources are kept in a set, and queued (in order of
+        # activation) for firing. A source no longer active is left
+        # in the queue, and skipped over when dequeued.
         self.source_active = set()
+        self.active_queue = collections.deque()
         self.fd_source = {}
         self._stop = False
         self.epoll = select.epoll()
@@ -101,9 +123,9 @@ class EventLoop:
     def init_signal_wakeup_fd(self):
         for signo in (signal.SIGTERM, signal.SIGHUP, signal.SIGINT):
             signal.signal(signo, lambda signo, frame: None)
-        self.s_rfd, self.s_wfd = os.pipe()
-        set_nonblocking(self.s_rfd)
-        set_nonblocking(self.s_wfd)
+        # An eventfd can't serve as the wakeup fd, since the signal
+        # module writes a single byte per signal.
+        self.s_rfd, self.s_wfd = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
         signal.set_wakeup_fd(self.s_wfd)
         self.epoll.register(self.s_rfd, select.EPOLLIN)
 
@@ -122,15 +144,30 @@ class EventLoop:
         del self.source_handler[source]
 
     def changed_fd(self, source):
-        self._unregister_fd(source)
-        self._register_fd(source)
+        old = self.source_fd.get(source)
+        if old is not None and source.fd == old[0]:
+            # Only the event mask changed, which requires a single
+            # epoll_ctl() call, rather than a removal and an addition.
+            fd = source.fd
+            self.source_fd[source] = (fd, source.mask)
+            try:
+                self.epoll.modify(fd, source.mask)
+            except FileNotFoundError:
+                # The fd was closed (and thus removed from the epoll
+                # set), and then reused
+                self.epoll.register(fd, source.mask)
+        else:
+            self._unregister_fd(source)
+            self._register_fd(source)
 
     def _register_fd(self, source):
         if source.fd is not None:
             self.source_fd[source] = (source.fd, source.mask)
             self.epoll.register(source.fd, source.mask)
             assert source.fd not in self.fd_source
-            self.fd_source[source.fd] = source
+            # The handler is kept alongside the source, to save a
+            # lookup per event dispatched.
+            self.fd_source[source.fd] = (source, self.source_handler[source])
 
     def _unregister_fd(self, source):
         if source in self.source_fd:
@@ -143,62 +180,120 @@ class EventLoop:
             del self.fd_source[fd]
 
     def changed_timeout(self, source):
-        self._unregister_timeout(source)
-        self._register_timeout(source)
+        entry = self.source_timeout.get(source)
+        if entry is not None and entry[0] == source.timeout:
+            return
+        if source.timeout is None:
+            self._unregister_timeout(source)
+        else:
+            # Registering replaces the old entry, making it stale
+            self._register_timeout(source)
 
     def _register_timeout(self, source):
         if source.timeout is not None:
-            self.source_timeout[source] = source.timeout
+            entry = (source.timeout, next(self.timeout_seq), source,
+                     self.source_handler[source])
+            self.source_timeout[source] = entry
+            heapq.heappush(self.timeout_heap, entry)
+            self._compact_timeouts()
 
     def _unregister_timeout(self, source):
         if source in self.source_timeout:
             del self.source_timeout[source]
+            self._compact_timeouts()
+
+    def _compact_timeouts(self):
+        # Avoid unbounded growth in case timeouts are changed
+        # frequently, but rarely expire.
+        if len(self.timeout_heap) > 2 * len(self.source_timeout) + 16:
+            self.timeout_heap = list(self.source_timeout.values())
+            heapq.heapify(self.timeout_heap)
+
+    def _is_stale(self, entry):
+        return self.source_timeout.get(entry[2]) is not entry
 
     def changed_active(self, source):
-        self._unregister_active(source)
-        self._register_active(source)
+        if source.active:
+            self._register_active(source)
+        else:
+            self._unregister_active(source)
 
     def _register_active(self, source):
-        if source.active:
+        if source.active and source not in self.source_active:
             self.source_active.add(source)
+            self.active_queue.append(source)
 
     def _unregister_active(self, source):
         if source in self.source_active:
             self.source_active.remove(source)
 
-    def next_relative_timeout(self):
-        timeouts = sorted(self.source_timeout.values())
-        if len(timeouts) == 0:
+    def next_relative_timeout(self, now=None):
+        heap = self.timeout_heap
+        while len(heap) > 0 and self._is_stale(heap[0]):
+            heapq.heappop(heap)
+        if len(heap) == 0:
             return -1
         else:
-            left = timeouts[0] - time.time()
+            if now is None:
+                now = time.time()
+            left = heap[0][0] - now
             if left > EPOLL_MAX_TIMEOUT:
                 return EPOLL_MAX_TIMEOUT
             if left > 0:
                 return left
             return 0
 
-    def fire_timeouts(self):
-        if len(self.source_timeout) > 0:
+    def fire_timeouts(self, now=None):
+        heap = self.timeout_heap
+        if len(heap) == 0:
+            return
+        if now is None:
             now = time.time()
-            active_handlers = []
-            for source, timeout in self.source_timeout.items():
-                if now >= timeout:
-                    handler = self.source_handler[source]
-                    active_handlers.append(handler)
-            for handler in active_handlers:
-                handler()
+        if heap[0][0] > now:
+            return
+        expired = []
+        while len(heap) > 0 and heap[0][0] <= now:
+            entry = heapq.heappop(heap)
+            if not self._is_stale(entry):
+                expired.append(entry)
+        # An expired timeout remains in effect until changed by its
+        # source.
+        for entry in expired:
+            heapq.heappush(heap, entry)
+        for entry in expired:
+            # A handler may have changed the timeout of, or removed, a
+            # source later in the list.
+            if not self._is_stale(entry):
+                entry[3]()
 
     def fire_actives(self):
-        while len(self.source_active) > 0:
-            source = next(iter(self.source_active))
-            handler = self.source_handler[source]
-            handler()
+        source_active = self.source_active
+        source_handler = self.source_handler
+        active_queue = self.active_queue
+        while len(active_queue) > 0:
+            source = active_queue.popleft()
+            if source not in source_active:
+                continue
+            # The source is dequeued while its handler runs, so that
+            # any (re-)registration made by the handler isn't
+            # duplicated.
+            source_active.remove(source)
+            source_handler[source]()
+            if source.active and source not in source_active and \
+               source in source_handler:
+                source_active.add(source)
+                active_queue.append(source)
 
     def check_signal(self):
+        # Several signals may have arrived since the last check. All
+        # wakeup bytes are consumed, so that none are left to cause a
+        # spurious stop in a later run().
         try:
-            os.read(self.s_rfd, 1)
-            self._stop = True
+            while True:
+                data = os.read(self.s_rfd, 4096)
+                self._stop = True
+                if len(data) < 4096:
+                    break
         except OSError:
             pass
 
@@ -212,35 +307,50 @@ class EventLoop:
         # reasons). However, it means this function needs to be
         # prepared for a situation where a fd no longer has a source
         # registered.
+        s_rfd = self.s_rfd
+        fd_source_get = self.fd_source.get
         for fd, event in fds:
-            if fd == self.s_rfd:
+            if fd == s_rfd:
                 self.check_signal()
+                if self._stop:
+                    return
             else:
-                source = self.fd_source.get(fd)
-                if source is None:
+                entry = fd_source_get(fd)
+                if entry is None:
                     continue
-                handler = self.source_handler[source]
-                handler()
+                entry[1]()
 
     def run(self):
+        fire_actives = self.fire_actives
+        next_relative_timeout = self.next_relative_timeout
+        fire_timeouts = self.fire_timeouts
+        poll = self.epoll.poll
+        handle_fds = self.handle_fds
+
         self._stop = False
         while True:
-            self.fire_actives()
+            fire_actives()
             if self._stop:
                 break
 
-            timeout = self.next_relative_timeout()
+            # Source timeouts are absolute wall-clock times (since they
+            # are derived from protocol-level timestamps), and thus the
+            # loop can't use the monotonic clock. The clock is read
+            # once for both deciding on, and firing, due timeouts.
+            now = time.time()
+
+            timeout = next_relative_timeout(now)
 
             if timeout == 0:
-                self.fire_timeouts()
+                fire_timeouts(now)
                 if self._stop:
                     break
             else:
-                fds = self.epoll.poll(timeout=timeout)
+                fds = poll(timeout=timeout)
                 if len(fds) > 0:
-                    self.handle_fds(fds)
+                    handle_fds(fds)
                 else:
-                    self.fire_timeouts()
+                    fire_timeouts()
                 if self._stop:
                     break
 
@@ -5,6 +5,32 @@ from enum import Enum, auto
 import collections
 import json
 
+
+def stdlib_json_encode(value):
+    return json.dumps(value).encode('utf-8')
+
+
+def stdlib_json_decode(data):
+    return json.loads(data.decode('utf-8'))
+
+
+# orjson is considerably faster than the standard library json module
+# and is used in case it's available. It's not a drop-in replacement:
+# NaN, Infinity and lone surrogates are rejected, and integers which
+# don't fit in 64 bits are decoded as floats (and thus reported as
+# not being integers, rather than as too large integers).
+try:
+    import orjson
+
+    def json_encode(value):
+        return orjson.dumps(value)
+
+    def json_decode(data):
+        return orjson.loads(data)
+except ImportError:
+    json_encode = stdlib_json_encode
+    json_decode = stdlib_json_decode
+
 MIN_VERSION = 2
 MAX_VERSION = 3
 VERSIONS = range(MIN_VERSION, MAX_VERSION + 1)
@@ -48,7 +74,6 @@ class Field:
         if value is None:
             raise ProtocolError("Message is missing required "
                                 "field \"%s\"" % self.name)
-        del in_msg[self.name]
         return value
 
     def put(self, value, out_msg):
@@ -133,6 +158,8 @@ FIELD_TA_CMD = StringField('ta-cmd')
 FIELD_TA_ID = NonNegativeIntField('ta-id')
 FIELD_MSG_TYPE = StringField('msg-type')
 
+HEADER_FIELDS = (FIELD_TA_CMD, FIELD_TA_ID, FIELD_MSG_TYPE)
+
 FIELD_FAIL_REASON = StringField('fail-reason')
 
 FIELD_PROTO_MIN_VERSION = NonNegativeIntField('protocol-minimum-version')
@@ -238,21 +265,36 @@ class TransactionType:
         self.opt_fail_fields = opt_fail_fields
 
         self.fields = {
-            MSG_TYPE_REQUEST: request_fields,
-            MSG_TYPE_ACCEPT: accept_fields,
-            MSG_TYPE_NOTIFY: notify_fields,
-            MSG_TYPE_INFORM: inform_fields,
-            MSG_TYPE_COMPLETE: complete_fields,
-            MSG_TYPE_FAIL: fail_fields
+            MSG_TYPE_REQUEST: tuple(request_fields),
+            MSG_TYPE_ACCEPT: tuple(accept_fields),
+            MSG_TYPE_NOTIFY: tuple(notify_fields),
+            MSG_TYPE_INFORM: tuple(inform_fields),
+            MSG_TYPE_COMPLETE: tuple(complete_fields),
+            MSG_TYPE_FAIL: tuple(fail_fields)
         }
 
         self.opt_fields = {
-            MSG_TYPE_REQUEST: opt_request_fields,
-            MSG_TYPE_ACCEPT: opt_accept_fields,
-            MSG_TYPE_NOTIFY: opt_notify_fields,
-            MSG_TYPE_INFORM: opt_inform_fields,
-            MSG_TYPE_COMPLETE: opt_complete_fields,
-            MSG_TYPE_FAIL: opt_fail_fields
+            MSG_TYPE_REQUEST: tuple(opt_request_fields),
+            MSG_TYPE_ACCEPT: tuple(opt_accept_fields),
+            MSG_TYPE_NOTIFY: tuple(opt_notify_fields),
+            MSG_TYPE_INFORM: tuple(opt_inform_fields),
+            MSG_TYPE_COMPLETE: tuple(opt_complete_fields),
+            MSG_TYPE_FAIL: tuple(opt_fail_fields)
+        }
+
+        # Per-message type schema, consisting of the required fields,
+        # the optional fields paired with their Python (keyword
+        # argument) names, and the names of all fields allowed on the
+        # wire, so that encoding and decoding a message only requires
+        # a single lookup
+        self.schemas = {
+            msg_type: (self.fields[msg_type],
+                       tuple((field, field.python_name())
+                             for field in opt_fields),
+                       frozenset(field.name for field in
+                                 HEADER_FIELDS + self.fields[msg_type] +
+                                 opt_fields))
+            for msg_type, opt_fields in self.opt_fields.items()
         }
 
         register_type(self, proto_versions)
@@ -365,7 +407,7 @@ class Message:
             # provisonal version, to recognize hello
             proto_version = MIN_VERSION
         try:
-            in_msg = json.loads(in_wire_msg.decode('utf-8'))
+            in_msg = json_decode(in_wire_msg)
 
             cmd = FIELD_TA_CMD.pull(in_msg)
             ta_id = FIELD_TA_ID.pull(in_msg)
@@ -373,26 +415,34 @@ class Message:
 
             ta_type = lookup_type(proto_version, cmd)
 
-            fields = ta_type.fields.get(msg_type)
-            opt_fields = ta_type.opt_fields.get(msg_type)
+            schema = ta_type.schemas.get(msg_type)
 
-            if fields is None:
+            if schema is None:
                 raise ProtocolError("Incoming request is of invalid type "
                                     "\"%s\"" % msg_type)
 
-            args = []
-            for field in fields:
-                args.append(field.pull(in_msg))
+            fields, opt_fields, field_names = schema
+
+            args = [field.pull(in_msg) for field in fields]
 
             optargs = {}
-            for field in opt_fields:
+            for field, name in opt_fields:
                 arg = field.pull(in_msg, opt=True)
                 if arg is not None:
-                    optargs[field.python_name()] = arg
-
-            if len(in_msg) > 0:
+                    optargs[name] = arg
+
+            # The header fields and the required fields are all
+            # present, since they were successfully pulled. Any other
+            # field, including an optional field with a null value,
+            # is unknown.
+            consumed = len(HEADER_FIELDS) + len(fields) + len(optargs)
+            if len(in_msg) > consumed:
+                unknown = {
+                    name: value for name, value in in_msg.items()
+                    if name not in field_names or value is None
+                }
                 raise ProtocolError("Message contains unknown field(s): %s" %
-                                    in_msg)
+                                    unknown)
 
             return Message(ta_type, ta_id, msg_type, args, optargs)
 
@@ -434,31 +484,28 @@ class Message:
         return self.msg_type in CLIENT_GENERATED_MSG_TYPES
 
     def to_wire(self):
-        out_msg = {}
-
-        fields = self.ta_type.fields[self.msg_type]
-        opt_fields = self.ta_type.opt_fields[self.msg_type]
+        fields, opt_fields, field_names = self.ta_type.schemas[self.msg_type]
 
-        FIELD_TA_CMD.put(self.ta_type.cmd, out_msg)
-        FIELD_TA_ID.put(self.ta_id, out_msg)
-        FIELD_MSG_TYPE.put(self.msg_type, out_msg)
+        # The header fields have no special encoding
+        out_msg = {
+            FIELD_TA_CMD.name: self.ta_type.cmd,
+            FIELD_TA_ID.name: self.ta_id,
+            FIELD_MSG_TYPE.name: self.msg_type
+        }
 
         assert len(self.args) == len(fields)
 
-        for i, field in enumerate(fields):
-            field.put(self.args[i], out_msg)
+        for field, arg in zip(fields, self.args):
+            field.put(arg, out_msg)
 
         optargs = self.optargs.copy()
-        for opt_field in opt_fields:
-            opt_name = opt_field.python_name()
-            if opt_name in optargs:
-                opt_value = optargs.get(opt_name)
-                if opt_value is not None:
-                    opt_field.put(opt_value, out_msg)
-                del optargs[opt_name]
+        for opt_field, opt_name in opt_fields:
+            opt_value = optargs.pop(opt_name, None)
+            if opt_value is not None:
+                opt_field.put(opt_value, out_msg)
         assert len(optargs) == 0
 
-        out_wire_msg = json.dumps(out_msg).encode('utf-8')
+        out_wire_msg = json_encode(out_msg)
         return out_wire_msg
 
 
@@ -298,9 +298,7 @@ class Connection:
             try:
                 subject_key_id = \
                     self.conn_sock.get_attr("tls.peer_subject_key_id")
-                subject_key_id_s = \
-                    ":".join(["%02x" % b for b in subject_key_id])
-                user_id = "ski:%s" % subject_key_id_s
+                user_id = "ski:%s" % subject_key_id.hex(":")
             except xcm.error:
                 self.warning("Unable to retrieve X509v3 Subject Key "
                              "Identifier. This attribute only exists in "
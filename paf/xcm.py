@@ -6,7 +6,6 @@
 #
 
 import os
-import socket
 
 from ctypes import CDLL, c_void_p, c_char_p, c_long, c_int, c_bool, \
     cast, POINTER, create_string_buffer, byref, get_errno
@@ -230,7 +229,7 @@ def _raise_io_err():
     raise error(_errno, os.strerror(_errno))
 
 
-error = socket.error
+error = OSError
 
 
 class ConnectionSocket(Socket):
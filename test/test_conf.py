@@ -0,0 +1,103 @@
+# SPDX-License-Identifier: BSD-3-Clause
+# Copyright(c) 2026 Ericsson AB
+
+import json
+import pytest
+import paf.conf as conf
+import paf.proto as proto
+
+
+def populate_domain(domain):
+    domain_conf = {"sockets": ["ux:test"]}
+    domain_conf.update(domain)
+
+    c = conf.Conf()
+    conf.populate(c, {"domains": [domain_conf]})
+
+    return c.domains[0]
+
+
+def test_clear_client_limit():
+    c = conf.default()
+
+    c.resources.total.set_limit("clients", 5)
+    assert c.resources.total.get_client_limit() == 5
+    assert c.resources.total.has_limits()
+
+    c.resources.total.clear_limit("clients")
+    assert c.resources.total.get_client_limit() is None
+    assert not c.resources.total.has_limits()
+
+
+def test_default_limits():
+    domain = populate_domain({})
+
+    assert domain.idle_limit.idle_min == conf.DEFAULT_IDLE_MIN
+    assert domain.idle_limit.idle_max == conf.DEFAULT_IDLE_MAX
+
+
+def test_legacy_max_idle_time():
+    domain = populate_domain({"max_idle_time": 99})
+    assert domain.idle_limit.idle_min == conf.DEFAULT_IDLE_MIN
+    assert domain.idle_limit.idle_max == 99
+
+    # An 'idle' section without 'max' resets the idle max to the
+    # default
+    domain = populate_domain({"max_idle_time": 99, "idle": {"min": 5}})
+    assert domain.idle_limit.idle_min == 5
+    assert domain.idle_limit.idle_max == conf.DEFAULT_IDLE_MAX
+
+    with pytest.raises(conf.DuplicateFieldError):
+        populate_domain({"max_idle_time": 99, "idle": {"max": 42}})
+
+
+def test_protocol_version():
+    domain = populate_domain({"protocol_version": {"min": 3}})
+
+    assert domain.proto_version_limit.version_min == 3
+    assert domain.proto_version_limit.version_max == proto.MAX_VERSION
+
+
+TLS_CONF = {
+    "domains": [
+        {
+            "name": "test",
+            "sockets": [
+                "ux:test",
+                {
+                    "addr": "tls:127.0.0.1:4711",
+                    "tls": {"cert": "/etc/cert.pem", "key": "/etc/key.pem"}
+                }
+            ],
+            "idle": {"min": 5, "max": 20}
+        }
+    ],
+    "resources": {"total": {"clients": 99}}
+}
+
+
+def test_load_json(tmp_path):
+    conf_file = tmp_path / "pafd.conf"
+    data = json.dumps(TLS_CONF, indent=2).encode('utf-8')
+    conf_file.write_bytes(data)
+
+    # The JSON decoder fast path must produce the same result as the
+    # YAML parser (JSON being a subset of YAML)
+    assert conf.load_source(conf_file) == conf.yaml_load(data)
+    assert conf.load_source(conf_file) == TLS_CONF
+
+
+def test_reload_unaffected_by_modification(tmp_path):
+    conf_file = tmp_path / "pafd.conf"
+    conf_file.write_text(json.dumps(TLS_CONF))
+
+    first = conf.load(conf_file)
+    first_str = str(first)
+
+    tls_attrs = first.domains[0].sockets[1].tls_attrs
+    tls_attrs["cert"] = "/tmp/other-cert.pem"
+
+    second = conf.load(conf_file)
+
+    assert second.domains[0].sockets[1].tls_attrs["cert"] == "/etc/cert.pem"
+    assert str(second) == first_str
@@ -0,0 +1,177 @@
+# SPDX-License-Identifier: BSD-3-Clause
+# Copyright(c) 2026 Ericsson AB
+
+import os
+import pytest
+import signal
+import time
+
+import paf.eventloop as eventloop
+
+
+# The event loop installs its own handlers for these signals
+LOOP_SIGNALS = (signal.SIGTERM, signal.SIGHUP, signal.SIGINT)
+
+
+@pytest.fixture
+def loop():
+    handlers = {signo: signal.getsignal(signo) for signo in LOOP_SIGNALS}
+    loop = eventloop.EventLoop()
+    yield loop
+    loop.close()
+    for signo, handler in handlers.items():
+        signal.signal(signo, handler)
+
+
+def test_remove_source_from_timeout_handler(loop):
+    now = time.time()
+    fired = []
+
+    first = eventloop.Source()
+    second = eventloop.Source()
+
+    def first_handler():
+        fired.append(first)
+        loop.remove(second)
+        loop.remove(first)
+        loop.stop()
+
+    loop.add(first, first_handler)
+    loop.add(second, lambda: fired.append(second))
+
+    first.set_timeout(now - 2)
+    second.set_timeout(now - 1)
+
+    loop.run()
+
+    assert fired == [first]
+
+
+def test_change_timeout_from_handler(loop):
+    now = time.time()
+    fired = []
+
+    first = eventloop.Source()
+    second = eventloop.Source()
+
+    def first_handler():
+        fired.append(first)
+        first.clear_timeout()
+        # Postpone the other source's already-expired timeout
+        second.set_timeout(time.time() + 0.1)
+
+    def second_handler():
+        fired.append((second, time.time()))
+        loop.stop()
+
+    loop.add(first, first_handler)
+    loop.add(second, second_handler)
+
+    first.set_timeout(now - 2)
+    second.set_timeout(now - 1)
+
+    loop.run()
+
+    assert len(fired) == 2
+    assert fired[0] is first
+    source, fired_at = fired[1]
+    assert source is second
+    assert fired_at >= now + 0.1
+
+
+def test_repeated_set_timeout_bounded(loop):
+    now = time.time()
+    fired = []
+
+    sources = [eventloop.Source() for _ in range(10)]
+
+    for source in sources:
+        loop.add(source, lambda source=source: fired.append(source))
+
+    for i in range(10000):
+        sources[i % len(sources)].set_timeout(now + 1000 + i)
+
+    assert len(loop.timeout_heap) <= 2 * len(sources) + 16
+
+    earliest = sources[0]
+    earliest.set_timeout(now - 1)
+
+    loop.fire_timeouts()
+
+    assert fired == [earliest]
+
+    for source in sources:
+        source.clear_timeout()
+
+    assert loop.next_relative_timeout() == -1
+
+
+def test_actives_fire_round_robin(loop):
+    fired = []
+
+    sources = [eventloop.Source() for _ in range(3)]
+
+    def handler(source):
+        fired.append(source)
+        if fired.count(source) == 3:
+            source.clear_active()
+        if len(fired) == 9:
+            loop.stop()
+
+    for source in sources:
+        loop.add(source, lambda source=source: handler(source))
+        source.set_active()
+
+    loop.run()
+
+    assert fired == sources * 3
+
+
+def test_remove_active_source_from_handler(loop):
+    fired = []
+
+    first = eventloop.Source()
+    second = eventloop.Source()
+
+    def first_handler():
+        fired.append(first)
+        loop.remove(second)
+        first.clear_active()
+        loop.stop()
+
+    loop.add(first, first_handler)
+    loop.add(second, lambda: fired.append(second))
+
+    first.set_active()
+    second.set_active()
+
+    loop.run()
+
+    assert fired == [first]
+
+
+def test_run_after_many_signals(loop):
+    for _ in range(5):
+        os.kill(os.getpid(), signal.SIGHUP)
+
+    # The signals stop the loop
+    loop.run()
+
+    fired = []
+
+    source = eventloop.Source()
+
+    def handler():
+        fired.append(source)
+        loop.stop()
+
+    loop.add(source, handler)
+
+    start = time.time()
+    source.set_timeout(start + 0.1)
+
+    # No signal is left to stop the second run
+    loop.run()
+
+    assert fired == [source]
+    assert time.time() - start >= 0.1
@@ -2263,6 +2263,28 @@ def run_misbehaving_client(addr, junk_msg, skip_hello=True):
             break
 
 
+@pytest.mark.fast
+def test_null_optional_field():
+    null_filter = {
+        proto.FIELD_TA_CMD.name: proto.CMD_SUBSCRIBE,
+        proto.FIELD_TA_ID.name: 42,
+        proto.FIELD_MSG_TYPE.name: proto.MSG_TYPE_REQUEST,
+        proto.FIELD_SUBSCRIPTION_ID.name: 4711,
+        proto.FIELD_FILTER.name: None
+    }
+    wire_msg = json.dumps(null_filter).encode('utf-8')
+
+    with pytest.raises(proto.ProtocolError,
+                       match="unknown field.*'filter': None"):
+        proto.Message.parse(proto.MAX_VERSION, wire_msg)
+
+    del null_filter[proto.FIELD_FILTER.name]
+    wire_msg = json.dumps(null_filter).encode('utf-8')
+
+    msg = proto.Message.parse(proto.MAX_VERSION, wire_msg)
+    assert msg.optargs == {}
+
+
 @pytest.mark.fast
 def test_misbehaving_clients(server):
     domain_addr = server.random_domain().random_addr()
@@ -2345,6 +2367,16 @@ def test_misbehaving_clients(server):
     run_misbehaving_client(domain_addr,
                            json.dumps(missing_fields).encode('utf-8'))
 
+    null_opt_field = {
+        proto.FIELD_TA_CMD.name: proto.CMD_SUBSCRIBE,
+        proto.FIELD_TA_ID.name: 42,
+        proto.FIELD_MSG_TYPE.name: proto.MSG_TYPE_REQUEST,
+        proto.FIELD_SUBSCRIPTION_ID.name: 4711,
+        proto.FIELD_FILTER.name: None
+    }
+    run_misbehaving_client(domain_addr,
+                           json.dumps(null_opt_field).encode('utf-8'))
+
     prop_value_not_list = {
         proto.FIELD_TA_CMD.name: proto.CMD_PUBLISH,
         proto.FIELD_TA_ID.name: 42,
@@ -3060,6 +3092,41 @@ def run(servers):
     os.remove("hook.tmp")
 
 
+@pytest.mark.fast
+@pytest.mark.require_resource_limits
+def test_cleared_client_limit(request):
+    server = server_by_request(request)
+
+    # A client limit of zero on the command line means no limit
+    server.use_config_file = False
+    server.max_clients = 0
+
+    domain = server.configure_random_domain(1)
+    server.start()
+
+    conns = [client.connect(domain.default_addr()) for _ in range(4)]
+
+    for conn in conns:
+        conn.ping()
+        conn.close()
+
+    server.stop()
+
+
+@pytest.mark.fast
+def test_daemon_version_and_help(request):
+    if request.config.option.server != "paf":
+        pytest.skip("Only applicable to pafd")
+
+    # Version and help requests are served before the configuration
+    # file is read
+    for opt, expected in (("-v", "Server version"), ("-h", "Usage")):
+        pafd = subprocess.run(["pafd", "-f", "nonexisting.conf", opt],
+                              stdout=subprocess.PIPE)
+        assert pafd.returncode == 0
+        assert expected in pafd.stdout.decode('utf-8')
+
+
 @pytest.mark.fast
 def test_handle_signals(request):
     if not xcm_has_uxf():
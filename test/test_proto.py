@@ -0,0 +1,96 @@
+# SPDX-License-Identifier: BSD-3-Clause
+# Copyright(c) 2026 Ericsson AB
+
+import pytest
+
+import paf.proto as proto
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def json_impl(request, monkeypatch):
+    # Run the tests with both JSON implementations, regardless of
+    # which one paf.proto picked
+    if request.param == "orjson":
+        orjson = pytest.importorskip("orjson")
+        monkeypatch.setattr(proto, "json_encode", orjson.dumps)
+        monkeypatch.setattr(proto, "json_decode", orjson.loads)
+    else:
+        monkeypatch.setattr(proto, "json_encode", proto.stdlib_json_encode)
+        monkeypatch.setattr(proto, "json_decode", proto.stdlib_json_decode)
+    return request.param
+
+
+def wire_msg(cmd, msg_type, fields):
+    msg = {
+        proto.FIELD_TA_CMD.name: cmd,
+        proto.FIELD_TA_ID.name: 42,
+        proto.FIELD_MSG_TYPE.name: msg_type
+    }
+    msg.update(fields)
+    return proto.stdlib_json_encode(msg)
+
+
+def publish_msg(**fields):
+    publish_fields = {
+        proto.FIELD_SERVICE_ID.name: 4711,
+        proto.FIELD_GENERATION.name: 0,
+        proto.FIELD_SERVICE_PROPS.name: {"name": ["foo"], "port": [99]},
+        proto.FIELD_TTL.name: 5
+    }
+    publish_fields.update(fields)
+    return wire_msg(proto.CMD_PUBLISH, proto.MSG_TYPE_REQUEST,
+                    publish_fields)
+
+
+def test_round_trip(json_impl):
+    props = {"name": {"foo", "bar"}, "port": {99}}
+    msg = proto.Message(proto.TA_PUBLISH, 42, proto.MSG_TYPE_REQUEST,
+                        [4711, 0, props, 5], {})
+
+    parsed = proto.Message.parse(proto.MAX_VERSION, msg.to_wire())
+
+    assert parsed.cmd() == proto.CMD_PUBLISH
+    assert parsed.ta_id == 42
+    assert parsed.is_request()
+    assert parsed.args == [4711, 0, props, 5]
+
+
+def test_optional_fields(json_impl):
+    msg = proto.Message(proto.TA_SUBSCRIBE, 17, proto.MSG_TYPE_REQUEST,
+                        [99], {"filter": "(name=foo)"})
+
+    parsed = proto.Message.parse(proto.MAX_VERSION, msg.to_wire())
+
+    assert parsed.args == [99]
+    assert parsed.optargs == {"filter": "(name=foo)"}
+
+
+def test_invalid_json(json_impl):
+    with pytest.raises(proto.ProtocolError, match="JSON"):
+        proto.Message.parse(proto.MAX_VERSION, b"not valid JSON at all")
+
+
+def test_unknown_field(json_impl):
+    with pytest.raises(proto.ProtocolError, match="unknown field"):
+        proto.Message.parse(proto.MAX_VERSION, publish_msg(foo=1))
+
+
+def test_negative_integer(json_impl):
+    with pytest.raises(proto.ProtocolError, match="negative"):
+        proto.Message.parse(proto.MAX_VERSION, publish_msg(ttl=-1))
+
+
+def test_too_large_integer(json_impl):
+    # Within 64 bits, but too large for a signed 64-bit integer
+    with pytest.raises(proto.ProtocolError, match="too large"):
+        proto.Message.parse(proto.MAX_VERSION, publish_msg(ttl=1 << 63))
+
+    # orjson decodes integers beyond 64 bits into floats, so the
+    # value is reported as not being an integer
+    if json_impl == "orjson":
+        error = "not an integer"
+    else:
+        error = "too large"
+
+    with pytest.raises(proto.ProtocolError, match=error):
+        proto.Message.parse(proto.MAX_VERSION, publish_msg(ttl=1 << 99))